@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+## Regression check of the batched transforms against
+## pyBOAT's per-signal routines, exits with 1 on mismatch
+import sys
+import logging
+import warnings
+import multiprocessing as mp
+
+import numpy as np
+from pyboat import core as pbcore
+
+import spyboat
+from spyboat import processing, datasets
+
+# importing spyboat already configured the root logger
+logging.getLogger('spyboat').setLevel(logging.WARNING)
+# the constant pixels give 0/0 on purpose
+warnings.simplefilter('ignore', RuntimeWarning)
+
+# relative to the largest absolute value of each output,
+# the batched transforms run in single precision
+RTOL = 1e-4
+
+dt = 2.
+Wkwargs = {'dt': dt, 'Tmin': 10, 'Tmax': 60, 'nT': 50}
+
+# the test data plus constant pixels, zero (black background)
+# and non-zero (saturated or offset background)
+movie = datasets.two_sines.astype(np.float32)
+movie[:, 0, 0] = 0
+movie[:, 0, 1] = 1000
+
+def transform_pyboat(movie, dt, Tmin, Tmax, nT, T_c = None, win_size = None):
+
+    '''
+    The reference: pixel-by-pixel with pyBOAT,
+    the way `transform_stack` used to do it.
+    '''
+
+    periods = processing.get_periods(movie.shape[0], dt, Tmin, Tmax, nT)
+    results = {key : np.zeros(movie.shape, dtype=np.float32)
+               for key in processing.RESULT_KEYS}
+
+    for y in range(movie.shape[1]):
+        for x in range(movie.shape[2]):
+
+            signal = movie[:, y, x].astype(float)
+            if T_c is not None:
+                signal = signal - pbcore.sinc_smooth(signal, T_c, dt)
+            if win_size is not None:
+                signal = pbcore.normalize_with_envelope(signal, win_size, dt)
+
+            sigma = np.std(signal)
+            Nt = len(signal)
+
+            modulus, wlet = pbcore.compute_spectrum(signal, dt, periods)
+            ridge_ys = pbcore.get_maxRidge_ys(modulus)
+
+            ridge_periods = periods[ridge_ys]
+            powers = modulus[ridge_ys, np.arange(Nt)]
+            phases = np.angle(wlet[ridge_ys, np.arange(Nt)]) % (2 * np.pi)
+
+            results['phase'][:, y, x] = phases
+            results['period'][:, y, x] = ridge_periods
+            results['power'][:, y, x] = powers
+            results['amplitude'][:, y, x] = pbcore.power_to_amplitude(
+                ridge_periods, powers, sigma, dt)
+
+    return results
+
+def compare(results, reference):
+
+    ''' Returns the failed comparisons as a list of messages '''
+
+    failed = []
+    for key in reference:
+        ref, res = reference[key], results[key]
+
+        if not np.array_equal(np.isnan(ref), np.isnan(res)):
+            failed.append(f'{key}: NaNs differ')
+            continue
+
+        diff = np.abs(ref - res)
+        # phases are circular
+        if key == 'phase':
+            diff = np.minimum(diff, 2 * np.pi - diff)
+        scale = np.nanmax(np.abs(ref))
+        if np.nanmax(diff) > RTOL * scale:
+            failed.append(f'{key}: max. relative error {np.nanmax(diff) / scale:.1e}')
+
+    return failed
+
+# the optional backends which can be switched off
+backends = {'numba' : ('center_signals', 'update_ridges', 'evaluate_ridges'),
+            'numexpr' : ('ne',)}
+
+def set_backend(name, saved):
+
+    '''
+    Restores the *saved* module attributes, then disables
+    the optional backends before *name* in `backends`.
+    The process pool of `run_parallel` gets replaced.
+    '''
+
+    for attr, value in saved.items():
+        setattr(processing, attr, value)
+
+    for backend, attributes in backends.items():
+        if backend == name:
+            break
+        for attr in attributes:
+            setattr(processing, attr, None)
+
+    processing.close_pool()
+
+def disabled_backends(_ = None):
+
+    ''' The switched off optional backends of the calling process '''
+
+    return tuple(attr for attr in processing.OPTIONAL_BACKENDS
+                 if getattr(processing, attr) is None)
+
+if __name__ == '__main__':
+
+    saved = {attr : getattr(processing, attr)
+             for attributes in backends.values() for attr in attributes}
+
+    # the test movie is small, still use the processes
+    # of `run_parallel` if there are several CPUs
+    processing.MIN_PIXELS_PER_WORKER = 1
+    n_cpu = min(2, mp.cpu_count())
+
+    n_failed = 0
+    for params in [{'T_c': 40}, {'win_size': 50}, {'T_c': 40, 'win_size': 50}]:
+
+        reference = transform_pyboat(movie, **Wkwargs, **params)
+
+        for backend in [*backends, 'numpy']:
+            set_backend(backend, saved)
+            if backend in backends and getattr(processing, backends[backend][0]) is None:
+                print(f'{backend} not available, skipping')
+                continue
+
+            runs = {'transform_stack' : spyboat.transform_stack(movie, **Wkwargs, **params),
+                    'run_parallel' : spyboat.run_parallel(movie, n_cpu, **Wkwargs, **params)}
+            if processing.cp is not None:
+                runs['run_gpu'] = spyboat.run_gpu(movie, **Wkwargs, **params)
+            for name, results in runs.items():
+                failed = compare(results, reference)
+                status = 'FAILED ' + ', '.join(failed) if failed else 'ok'
+                print(f'{params} {backend} {name}: {status}')
+                n_failed += len(failed)
+
+            # the processes of `run_parallel` have to use the same backend,
+            # with a single CPU everything runs in this process
+            if n_cpu > 1:
+                workers = processing.get_pool(n_cpu).map(disabled_backends,
+                                                         range(n_cpu), chunksize=1)
+                if set(workers) != {disabled_backends()}:
+                    print(f'{params} {backend} run_parallel: FAILED '
+                          f'processes switched off {set(workers)}')
+                    n_failed += 1
+
+    sys.exit(1 if n_failed else 0)
@@ -86,7 +86,9 @@ if not scale_factor:
 
 elif 0 < scale_factor < 100:
     logger.info(f'Downsampling the movie to {scale_factor:d}% of its original size..')
-    movie = spyboat.down_sample(movie, scale_factor / 100)
+    # anti-aliasing only if no Gaussian pre-smoothing follows
+    movie = spyboat.down_sample(movie, scale_factor / 100,
+                                anti_aliasing = not arguments.gauss_sigma)
 else:
     raise ValueError('Scale factor must be between 0 and 100!')
 
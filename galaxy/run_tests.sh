@@ -9,6 +9,11 @@ SCRIPT_PATH='.'
 
 python3 $SCRIPT_PATH/cl_wrapper.py --input_path $INPUT_PATH --phase_out phase_twosines_out.tif --period_out period_twosines_out.tif --power_out power_twosines_out.tif  --amplitude_out amplitude_twosines_out.tif --dt 2. --Tmin 20 --Tmax 30 --nT 200 --ncpu 6 --save_input True --masking dynamic
 
+printf "\n"
+
+# batched transforms vs. pyBOAT's per-signal routines
+python3 $SCRIPT_PATH/check_against_pyboat.py
+
 printf "\n"
 # printf "\nError examples:\n"
 
@@ -31,7 +31,8 @@ Wkwargs = {'dt' : dt, # sampling interval
            'T_c' : 40,  # sinc cut off period, in hours, None disables detrending
            'win_size' : None}   # Ampl. normalization sliding window size, None disables
 
-# down sample to 80% of original size
+# down sample to 80% of original size, without anti-aliasing
+# as the gaussian blur below smoothes anyway
 ds_movie = spyboat.down_sample(test_movie, 0.8)
 
 # gaussian blur
@@ -11,6 +11,6 @@ from .util import down_sample, gaussian_blur
 from .util import create_fixed_mask, create_dynamic_mask, apply_mask
 
 # analysis
-from .processing import transform_stack, run_parallel
+from .processing import transform_stack, run_parallel, run_gpu
 
 
@@ -0,0 +1,163 @@
+'''
+Optional Numba kernels for the hot loops of the processing,
+importing this module fails if Numba is not installed.
+
+The kernels are compiled without `parallel=True` on purpose,
+parallelism comes from the processes of `run_parallel` and
+Numba's default threading layer does not survive forking.
+'''
+
+import numpy as np
+from numba import njit
+
+# like fastmath=True, but without assuming finite values
+FASTMATH = {'nsz', 'arcp', 'contract', 'afn', 'reassoc'}
+
+# division by zero gives NaN/inf like NumPy instead of raising,
+# e.g. for the powers of constant (zero variance) signals
+ERROR_MODEL = 'numpy'
+
+@njit(fastmath=FASTMATH, error_model=ERROR_MODEL, cache=True)
+def center_signals(signals, trend):
+
+    '''
+    Subtracts the *trend* and the mean from *signals*, and computes
+    their standard deviations in the same pass.
+
+    Parameters
+    ----------
+
+    signals : ndarray with shape (Npixels, Nt)
+    trend : ndarray with shape (Npixels, Nt) or None
+
+    Returns
+    -------
+
+    centered : ndarray with shape (Npixels, Nt)
+    sigma : ndarray with shape (Npixels,)
+    '''
+
+    Npixels, Nt = signals.shape
+
+    centered = np.empty(signals.shape, dtype=signals.dtype)
+    sigma = np.empty(Npixels, dtype=signals.dtype)
+
+    for p in range(Npixels):
+
+        mean = 0.
+        m2 = 0.
+        for t in range(Nt):
+            v = signals[p, t]
+            if trend is not None:
+                v = v - trend[p, t]
+            centered[p, t] = v
+
+            # Welford's update, stable also for large offsets
+            delta = v - mean
+            mean += delta / (t + 1)
+            m2 += delta * (v - mean)
+
+        for t in range(Nt):
+            centered[p, t] -= mean
+
+        # accumulated in double precision
+        sigma[p] = np.sqrt(m2 / Nt)
+
+    return centered, sigma
+
+@njit(fastmath=FASTMATH, error_model=ERROR_MODEL, cache=True)
+def update_ridges(s, wlet_re, wlet_im, best, ridge_ys, ridge_re, ridge_im):
+
+    '''
+    Updates the running maximum of the wavelet power along the
+    scale axis with the transforms of scale *s*, in place.
+
+    Parameters
+    ----------
+
+    s : int, index of the scale
+    wlet_re : ndarray with shape (Npixels, Nt),
+              real parts of the wavelet transforms at scale *s*
+    wlet_im : ndarray with shape (Npixels, Nt),
+              imaginary parts of the wavelet transforms at scale *s*
+    best : ndarray with shape (Npixels, Nt), the maximal powers so far,
+           initialized with -inf
+    ridge_ys : int ndarray with shape (Npixels, Nt), their scale indices
+    ridge_re : ndarray with shape (Npixels, Nt), their real parts
+    ridge_im : ndarray with shape (Npixels, Nt), their imaginary parts
+    '''
+
+    Npixels, Nt = wlet_re.shape
+
+    for p in range(Npixels):
+        for t in range(Nt):
+            re = wlet_re[p, t]
+            im = wlet_im[p, t]
+            m = re * re + im * im
+            # like argmax, the first maximum wins
+            # and a NaN counts as the maximum
+            b = best[p, t]
+            if m > b or (np.isnan(m) and not np.isnan(b)):
+                best[p, t] = m
+                ridge_ys[p, t] = s
+                ridge_re[p, t] = re
+                ridge_im[p, t] = im
+
+@njit(fastmath=FASTMATH, error_model=ERROR_MODEL, cache=True)
+def evaluate_ridges(best, ridge_ys, ridge_re, ridge_im,
+                    sigma, periods, amp_factors):
+
+    '''
+    Evaluates the ridges found by `update_ridges` for
+    every time point and signal in one pass.
+
+    Parameters
+    ----------
+
+    best : ndarray with shape (Npixels, Nt), the wavelet power
+           at the ridge
+    ridge_ys : int ndarray with shape (Npixels, Nt), the scale
+               indices of the ridge
+    ridge_re : ndarray with shape (Npixels, Nt), real parts
+               of the wavelet transforms at the ridge
+    ridge_im : ndarray with shape (Npixels, Nt), imaginary parts
+               of the wavelet transforms at the ridge
+    sigma : ndarray with shape (Npixels,), standard deviations
+            of the signals
+    periods : ndarray with shape (nT,), the periods scanned
+    amp_factors : ndarray with shape (nT,), factors converting
+                  the power of normalized signals to amplitudes,
+                  see `pyboat.core.power_to_amplitude`
+
+    Returns
+    -------
+
+    phases, ridge_periods, powers, amplitudes : 32bit ndarrays
+                                                with shape (Npixels, Nt)
+    '''
+
+    Npixels, Nt = best.shape
+
+    phases = np.empty((Npixels, Nt), dtype=np.float32)
+    ridge_periods = np.empty((Npixels, Nt), dtype=np.float32)
+    powers = np.empty((Npixels, Nt), dtype=np.float32)
+    amplitudes = np.empty((Npixels, Nt), dtype=np.float32)
+
+    for p in range(Npixels):
+        for t in range(Nt):
+            s = ridge_ys[p, t]
+
+            # map to [0, 2pi]
+            phase = np.arctan2(ridge_im[p, t], ridge_re[p, t])
+            if phase < 0:
+                phase += 2 * np.pi
+
+            # normalized with the variance of the signal
+            power = best[p, t] / sigma[p]**2
+
+            phases[p, t] = phase
+            ridge_periods[p, t] = periods[s]
+            powers[p, t] = power
+            amplitudes[p, t] = np.sqrt(power) * amp_factors[s] * sigma[p]
+
+    return phases, ridge_periods, powers, amplitudes
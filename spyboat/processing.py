@@ -7,16 +7,72 @@ is the computational core of the spyboat module
 '''
 
 import sys
+import atexit
+from functools import lru_cache
 import numpy as np
 import multiprocessing as mp
+from multiprocessing.shared_memory import SharedMemory
 import logging
+from scipy.fft import rfft, irfft, next_fast_len
+from scipy.signal import savgol_filter
+from scipy.ndimage import maximum_filter1d, minimum_filter1d
 
 # wavelet analysis
 from pyboat import core as pbcore
 
+# optional, GPU processing
+try:
+    import cupy as cp
+except ImportError:
+    cp = None
+
+# optional, compiled kernels
+try:
+    from ._numba_kernels import center_signals, update_ridges, evaluate_ridges
+except ImportError:
+    center_signals = update_ridges = evaluate_ridges = None
+
+# optional, fused arithmetic if Numba is not available
+try:
+    import numexpr as ne
+except ImportError:
+    ne = None
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# order of the output movies in shared memory
+RESULT_KEYS = ('phase', 'period', 'power', 'amplitude')
+
+# below that many pixels per process, starting
+# the processes costs more than it saves
+MIN_PIXELS_PER_WORKER = 2048
+
+# stripes of pixels per process, finished stripes get copied
+# out while the processes work on the remaining ones
+STRIPES_PER_WORKER = 4
+
+# signals varying less than this fraction of their magnitude
+# are constant within single precision rounding
+FLAT_RTOL = 1e-6
+
+# memory in bytes the temporaries of `transform_signals` may take up,
+# larger movies get transformed in blocks of pixels
+TRANSFORM_MEMORY = 2**26
+
+# threads used by the FFTs, -1 uses all CPUs. The processes
+# of `run_parallel` use one thread each to not oversubscribe the CPUs
+FFT_WORKERS = -1
+
+# the optional backends, can be switched off by setting
+# them to None. The `run_parallel` processes follow the parent
+OPTIONAL_BACKENDS = ('center_signals', 'update_ridges', 'evaluate_ridges', 'ne')
+
+# the process pool of `run_parallel`, kept alive between calls,
+# and the settings it was created with
+_pool = None
+_pool_key = None
+
 # --- Spatial Wavelet Analysis ---
 
 def transform_stack(movie, dt, Tmin, Tmax, nT, T_c = None, win_size = None):
@@ -33,6 +89,10 @@ def transform_stack(movie, dt, Tmin, Tmax, nT, T_c = None, win_size = None):
     long time as ydim \times xdim transformations have to be calculated!
     Parallel execution is recommended (see `run_parallel` below).
 
+    The pixels get transformed in blocks with FFT-based convolutions,
+    see `TRANSFORM_MEMORY`. The results are the same as
+    with pyBOAT's per-signal routines.
+
     Parameters
     ----------
 
@@ -57,91 +117,568 @@ def transform_stack(movie, dt, Tmin, Tmax, nT, T_c = None, win_size = None):
 
     '''
 
+    Nt = movie.shape[0]
+    periods = get_periods(Nt, dt, Tmin, Tmax, nT)
+    
+    ydim, xdim = movie.shape[1:] # F, Y, X ordering
+    
+    Npixels = ydim * xdim
+    
+    logger.info(f'Computing the transforms for {Npixels} pixels')
+    sys.stdout.flush()
+
+    frames = movie.reshape(Nt, Npixels)
+    block_size = get_block_size(Nt, TRANSFORM_MEMORY)
+    # a single block shows its progress over the scales
+    single_block = block_size >= Npixels
+
+    # the final movies in (Frames, Pixels) ordering
+    results = {key : np.empty((Nt, Npixels), dtype=np.float32)
+               for key in RESULT_KEYS}
+
+    for start in range(0, Npixels, block_size):
+
+        stop = min(start + block_size, Npixels)
+        # transpose block-wise, so that every time-series is contiguous
+        signals = np.ascontiguousarray(frames[:, start:stop].T)
+        block = transform_signals(signals, dt, periods, T_c, win_size,
+                                  show_progress = single_block)
+        for key in RESULT_KEYS:
+            results[key][:, start:stop] = block[key].T
+
+        # show progress over the blocks, roughly every 10%
+        if not single_block and int(10 * stop / Npixels) > int(10 * start / Npixels):
+            logger.info(f"Processed {stop/Npixels * 100 :.1f}%..")
+
+    # back to (Frames, Y, X) ordering, no copy needed
+    for key in results:
+        results[key] = results[key].reshape(movie.shape)
+    
+    return results
+
+def get_periods(Nt, dt, Tmin, Tmax, nT):
+
+    '''
+    The *nT* periods to scan for, *Tmin* and *Tmax* get 
+    clipped to the range resolvable for *Nt* samples.
+
+    Returns
+    -------
+
+    periods : ndarray with ndim = 1
+    '''
+
     if Tmin < 2 * dt:
         logger.warning('Warning, Nyquist limit is 2 times the sampling interval!')
         logger.info('..setting Tmin to {:.2f}'.format( 2 * dt ))
         Tmin = 2 * dt
 
-    if Tmax > dt * movie.shape[0]: 
+    if Tmax > dt * Nt: 
         logger.warning('Warning: Very large periods chosen!')
         logger.info('..setting Tmax to {:.2f}'.format( dt * Nt ))
         Tmax = dt * Nt
     
-    # the periods to scan for
-    periods = np.linspace(Tmin, Tmax, nT)
+    return np.linspace(Tmin, Tmax, nT)
+
+def get_block_size(Nt, memory):
+
+    '''
+    The number of time-series of length *Nt* which can be
+    transformed at once with *memory* bytes for the temporaries.
+    '''
+
+    Nfft = next_fast_len(2 * Nt - 1)
     
-    # create output arrays, needs 32bit for Fiji FloatProcessor :/
-    period_movie = np.zeros(movie.shape, dtype=np.float32)  
-    phase_movie = np.zeros(movie.shape, dtype=np.float32)  
-    power_movie = np.zeros(movie.shape, dtype=np.float32)  
-    amplitude_movie = np.zeros(movie.shape, dtype=np.float32)  
+    # complex64: the signal spectrum, its product with a wavelet
+    # spectrum, the copy the inverse FFT works on and its workspace
+    spectra = 4 * 8 * (Nfft // 2 + 1)
+    # float32: the real and imaginary wavelet transforms
+    transforms = 2 * 4 * Nfft
+    # the ridge buffers, the temporaries of the running
+    # maximum and of the ridge evaluation, the results
+    buffers = 52 * Nt
 
-    ydim, xdim = movie.shape[1:] # F, Y, X ordering
+    return max(1, memory // (spectra + transforms + buffers))
+
+def transform_signals(signals, dt, periods, T_c = None, win_size = None,
+                      show_progress = True):
+
+    '''
+    The batched core of `transform_stack`, analyzes all time-series
+    stored in the rows of *signals* at once.
+
+    Parameters
+    ----------
+
+    signals : ndarray with shape (Npixels, Nt), transform is done
+              along the last axis
+    dt    : float, sampling interval               
+    periods : ndarray, the periods to scan for, see `get_periods`
+    T_c : float, sinc cut off period, None disables detrending
+    win_size   : float, amplitude normalization sliding window size,
+                 None disables normalization
+    show_progress : bool, log the progress over the scales, `run_parallel`
+                    logs the progress over its stripes instead
+
+    Returns
+    -------
     
-    Npixels = ydim * xdim
+    results : dictionary, with keys holding 32bit ndarrays 
+              with the same shape as *signals*, see `transform_stack`
+    '''
+
+    Npixels, Nt = signals.shape
+    nT = len(periods)
     
-    logger.info(f'Computing the transforms for {Npixels} pixels')
-    sys.stdout.flush()
+    signals, sigma = preprocess_signals(signals, dt, T_c, win_size)
+
+    # zero-padded FFT length, large enough for a linear convolution
+    # with the longest possible Morlet wavelet (Nt samples)
+    Nfft = next_fast_len(2 * Nt - 1)
+    sig_spec = rfft(signals, n=Nfft, axis=-1, workers=FFT_WORKERS)
+    re_specs, im_specs = wavelet_spectra(Nt, dt, tuple(periods), Nfft)
+
+    # the wavelet transforms of all pixels, one scale at a time,
+    # as two real convolutions for the real and imaginary part
+
+    # running maximum of the power along the scale axis, only the
+    # transforms at the ridge get kept. Like argmax, the first
+    # maximum wins and a NaN counts as the maximum
+    best = np.full((Npixels, Nt), -np.inf, dtype=np.float32)
+    ridge_ys = np.zeros((Npixels, Nt), dtype=np.int32)
+    ridge_re = np.zeros((Npixels, Nt), dtype=np.float32)
+    ridge_im = np.zeros((Npixels, Nt), dtype=np.float32)
+    # scale indices at which to show progress, roughly every 10%
+    if show_progress:
+        checkpoints = {int(nT * k / 10) for k in range(1, 10)} - {0}
+    else:
+        checkpoints = set()
+    for i in range(nT):
+
+        if i in checkpoints:
+            logger.info(f"Processed {i/nT * 100 :.1f}%..")
+        
+        wlet_re = irfft(sig_spec * re_specs[i], n=Nfft,
+                        axis=-1, workers=FFT_WORKERS)[:, :Nt]
+        wlet_im = irfft(sig_spec * im_specs[i], n=Nfft,
+                        axis=-1, workers=FFT_WORKERS)[:, :Nt]
+
+        if update_ridges is not None:
+            update_ridges(i, wlet_re, wlet_im, best,
+                          ridge_ys, ridge_re, ridge_im)
+        else:
+            # same for all pixels: the maximum along the scale axis,
+            # the normalization doesn't change it
+            if ne is not None:
+                modulus = ne.evaluate('wlet_re**2 + wlet_im**2')
+                # x != x is the NaN test of numexpr
+                better = ne.evaluate('(modulus > best) | '
+                                     '((modulus != modulus) & (best == best))')
+            else:
+                modulus = wlet_re**2 + wlet_im**2
+                better = ((modulus > best) |
+                          (np.isnan(modulus) & ~np.isnan(best)))
+            np.copyto(best, modulus, where=better)
+            np.copyto(ridge_ys, i, where=better)
+            np.copyto(ridge_re, wlet_re, where=better)
+            np.copyto(ridge_im, wlet_im, where=better)
+
+    if evaluate_ridges is not None:
+        # conversion factors for unit variance signals
+        amp_factors = pbcore.power_to_amplitude(periods, 1, 1, dt)
+        phases, ridge_periods, powers, amplitudes = evaluate_ridges(
+            best, ridge_ys, ridge_re, ridge_im, sigma, periods, amp_factors)
+
+    elif ne is not None:
+        ridge_periods = periods[ridge_ys]
+        # the amplitude conversion in closed form, for unit
+        # variance signals the factors only depend on the period
+        amp_factors = pbcore.power_to_amplitude(periods, 1, 1, dt)
+        ridge_factors = amp_factors.astype(np.float32)[ridge_ys]
+        sigma = sigma[:, None]
+        # float32 scalar, a Python float would upcast to 64bit
+        two_pi = np.float32(2 * np.pi)
+
+        # normalize with the variance of the signals, like pyBOAT does
+        powers = ne.evaluate('best / (sigma * sigma)')
+        phases = ne.evaluate('arctan2(ridge_im, ridge_re)')
+        # map to [0, 2pi]
+        ne.evaluate('where(phases < 0, phases + two_pi, phases)', out=phases)
+        # not simplified to sqrt(best) * ridge_factors, so that
+        # constant signals give NaN (0/0) like pyBOAT
+        amplitudes = ne.evaluate('sqrt(powers) * ridge_factors * sigma')
+
+    else:
+        ridge_periods = periods[ridge_ys]
+        # normalize with the variance of the signals, like pyBOAT does
+        powers = best / sigma[:, None]**2
+        # map to [0, 2pi]
+        phases = np.arctan2(ridge_im, ridge_re) % (2 * np.pi)
+        amplitudes = pbcore.power_to_amplitude(ridge_periods,
+                                               powers, sigma[:, None], dt)
+
+    # needs 32bit for Fiji FloatProcessor :/
+    results = {'phase' : phases, 'period' : ridge_periods,
+               'power' : powers, 'amplitude' : amplitudes}
+    for key in results:
+        results[key] = results[key].astype(np.float32, copy=False)
+    
+    return results
+
+def preprocess_signals(signals, dt, T_c = None, win_size = None):
 
-    # loop over pixel coordinates
-    for x in range(xdim):
+    '''
+    Detrending, amplitude normalization and mean subtraction
+    of all time-series stored in the rows of *signals*,
+    as done before the wavelet transforms.
 
-        for y in range(ydim):
+    Returns
+    -------
 
-            # show progress
-            if Npixels < 10:
-                logger.info(f"Processed {(ydim*x + y)/Npixels * 100 :.1f}%..")
-                sys.stdout.flush()
+    signals : ndarray with the same shape as the input *signals*
+    sigma : ndarray, the standard deviation of each signal
+    '''
 
-            elif (ydim*x + y)%(int(Npixels/5)) == 0 and x != 0:
-                logger.info(f"Processed {(ydim*x + y)/Npixels * 100 :.1f}%..")
-            
-            input_vec = movie[:, y, x]  # the time_series at pixel (x,y)
+    # single precision is plenty, and halves the memory traffic
+    signals = signals.astype(np.float32)
 
-            signal = input_vec
+    # constant signals get zeroed, otherwise the rounding residue of
+    # the detrending gets normalized with its own tiny sigma (or
+    # envelope) and looks like an oscillation. Zero signals have
+    # sigma = 0 and give NaN powers, like pyBOAT does
+    flat = np.ptp(signals, axis=-1) <= FLAT_RTOL * np.abs(signals).max(axis=-1)
+    signals[flat] = 0
             
-            # detrending
-            if T_c is not None:
-                trend = pbcore.sinc_smooth(signal, T_c, dt)
-                signal = signal - trend
+    # detrending
+    if T_c is not None:
+        trend = sinc_smooth(signals, T_c, dt)
+    else:
+        trend = None
                 
-            # amplitude normalization?
-            if win_size is not None:
-                signal = pbcore.normalize_with_envelope(signal, win_size, dt)
+    # amplitude normalization?
+    if win_size is not None:
+        if trend is not None:
+            signals = signals - trend
+            trend = None
+        signals = normalize_with_envelope(signals, win_size, dt)
+
+    # pyBOAT subtracts the mean before the transform
+    if center_signals is not None:
+        # one pass for detrending, centering and the std
+        signals, sigma = center_signals(signals, trend)
+
+    elif ne is not None:
+        # single passes without temporaries
+        if trend is not None:
+            signals = ne.evaluate('signals - trend')
+        mean = signals.mean(axis=-1, keepdims=True)
+        signals = ne.evaluate('signals - mean')
+        sigma = np.std(signals, axis=-1)
+
+    else:
+        if trend is not None:
+            signals = signals - trend
+        signals = signals - signals.mean(axis=-1, keepdims=True)
+        sigma = np.std(signals, axis=-1)
+
+    return signals, sigma
+
+# --- Batched versions of the pyBOAT pre-processing and CWT ---
+
+def sinc_smooth(signals, T_c, dt):
 
-            sigma = np.std(signal)
-            Nt = len(signal)
-            
-            modulus, wlet = pbcore.compute_spectrum(signal, dt, periods)
-            ridge_ys = pbcore.get_maxRidge_ys(modulus)
-
-            ridge_periods = periods[ridge_ys]
-            powers = modulus[ridge_ys, np.arange(Nt)]
-            phases = np.angle(wlet[ridge_ys, np.arange(Nt)])
-            # map to [0, 2pi]
-            phases = phases % (2 * np.pi)
-            amplitudes = pbcore.power_to_amplitude(ridge_periods,
-                                                    powers, sigma, dt)
-            
-            phase_movie[:, y, x] = phases
-            period_movie[:, y, x] = ridge_periods
-            power_movie[:, y, x] = powers
-            amplitude_movie[:, y, x] = amplitudes
+    '''
+    Sinc filtering of all time-series stored in the rows
+    of *signals* at once, gives the same results as
+    `pyboat.core.sinc_smooth` applied row by row.
+
+    Parameters
+    ----------
+
+    signals : ndarray with ndim = 2, filtering is done along last axis
+    T_c : float, sinc cut off period
+    dt : float, sampling interval
+
+    Returns
+    -------
+
+    trend : ndarray with the same shape as *signals*
+    '''
+
+    Nt = signals.shape[-1]
+
+    # same filter length as pyBOAT's default
+    M = min(Nt - 1, pbcore.M_max)
+    M = M - M % 2
+    
+    # pad the boundaries exactly like `pyboat.core.smooth` does
+    padded = np.concatenate([signals[:, M:0:-1], signals, signals[:, :-M-1:-1]],
+                            axis=-1)
+
+    # circular convolution, the wrap around only
+    # reaches into the first M samples which get discarded
+    Nfft = next_fast_len(padded.shape[-1])
+    spectrum = sinc_spectrum(M, dt, T_c, Nfft)
+    padded_spec = rfft(padded, n=Nfft, axis=-1, workers=FFT_WORKERS)
+    trend = irfft(padded_spec * spectrum, n=Nfft, axis=-1,
+                  workers=FFT_WORKERS)
+
+    return trend[:, M + M // 2 : M + M // 2 + Nt].astype(signals.dtype,
+                                                          copy=False)
+
+@lru_cache(maxsize=8)
+def sinc_spectrum(M, dt, T_c, Nfft):
+
+    '''
+    Fourier transform of the normalized sinc filter of
+    length M + 1, cached to be reused by all calls with 
+    the same parameters, e.g. for the slices of `run_parallel`.
+
+    Returns
+    -------
+
+    spectrum : read-only complex64 ndarray with shape (Nfft // 2 + 1,)
+    '''
+
+    w = pbcore.sinc_filter(M, f_c = dt / T_c)
+    spectrum = rfft(w / w.sum(), n=Nfft).astype(np.complex64)
+    # the same array gets handed out for every cache hit
+    spectrum.flags.writeable = False
+
+    return spectrum
+
+def normalize_with_envelope(signals, window_size, dt):
+
+    '''
+    Amplitude normalization of all time-series stored in the rows
+    of *signals* at once, gives the same results as
+    `pyboat.core.normalize_with_envelope` applied row by row.
+
+    Parameters
+    ----------
+
+    signals : ndarray with ndim = 2, the (detrended) signals,
+              normalization is done along the last axis
+    window_size : float, the sliding window size in time units
+    dt : float, sampling interval
+
+    Returns
+    -------
+
+    norm_signals : ndarray with the same shape as *signals*
+    '''
+
+    Nt = signals.shape[-1]
+
+    if window_size > (Nt - 1) * dt:
+        window_size = (Nt - 1) * dt
+        logger.warning(f'Warning, setting window_size to {window_size}!')
+    
+    # window size in sampling interval units, has to be odd
+    window_size = int(window_size / dt)
+    if window_size % 2 != 1:
+        window_size = window_size + 1
+
+    centered = signals - signals.mean(axis=-1, keepdims=True)
 
-    results = {'phase' : phase_movie, 'period' : period_movie,
-               'power' : power_movie, 'amplitude' : amplitude_movie}
+    # max - min / 2 in the sliding window, the window
+    # gets truncated at the boundaries
+    envelope = (maximum_filter1d(centered, window_size, axis=-1, mode='nearest') -
+                minimum_filter1d(centered, window_size, axis=-1, mode='nearest')) / 2
+    envelope = savgol_filter(envelope, window_length=window_size,
+                             polyorder=3, axis=-1).astype(signals.dtype)
+
+    return signals / envelope
+
+def morlet_kernels(Nt, dt, periods, Nfft):
+
+    '''
+    Evaluates the Morlet wavelets `pyboat.core.CWT` convolves the
+    signals with, one for each period. The wavelets are zero-padded
+    to length *Nfft* and shifted such that a circular convolution
+    with a zero-padded signal of length *Nt* gives the
+    'same'-mode linear convolution in its first *Nt* entries.
+
+    Parameters
+    ----------
+
+    Nt : int, length of the signals
+    dt : float, sampling interval
+    periods : ndarray, the periods to scan for
+    Nfft : int, length of the output kernels, must be at least
+                `2 * Nt - 1`
+
+    Returns
+    -------
+
+    kernels : complex ndarray with shape (len(periods), Nfft)
+    '''
+
+    scales = pbcore.scales_from_periods(periods, 1 / dt, pbcore.omega0)
+    Morlet = pbcore.mk_Morlet(pbcore.omega0)
+    
+    kernels = np.zeros((len(periods), Nfft), dtype=complex)
+    for i, scale in enumerate(scales):
+
+        # support cut off at 1/peak_fraction of Morlet peak
+        y0 = pbcore.gauss_envelope(0, scale)
+        x_max = int(pbcore.inverse_gauss(y0 / pbcore.peak_fraction, scale))
+
+        # max support is length of signal
+        if 2 * x_max > Nt:
+            vec = np.arange(-Nt / 2, Nt / 2)
+        else:
+            vec = np.arange(-x_max, x_max)
+
+        kernels[i, :len(vec)] = Morlet(vec, scale)
+        # np.convolve's 'same' mode starts at this offset
+        kernels[i] = np.roll(kernels[i], -((len(vec) - 1) // 2))
+
+    return kernels
+
+@lru_cache(maxsize=8)
+def wavelet_spectra(Nt, dt, periods, Nfft):
+
+    '''
+    Fourier transforms of the real and imaginary parts of the
+    `morlet_kernels`, cached to be reused by all calls with the same
+    parameters, e.g. for the slices of `run_parallel`. The *periods*
+    have to be given as a tuple to be hashable.
+
+    Returns
+    -------
+
+    re_spectra : read-only complex64 ndarray with 
+                 shape (len(periods), Nfft // 2 + 1)
+    im_spectra : read-only complex64 ndarray with
+                 shape (len(periods), Nfft // 2 + 1)
+    '''
+
+    kernels = morlet_kernels(Nt, dt, np.array(periods), Nfft)
     
+    re_spectra = rfft(kernels.real, axis=1).astype(np.complex64)
+    im_spectra = rfft(kernels.imag, axis=1).astype(np.complex64)
+    # the same arrays get handed out for every cache hit
+    re_spectra.flags.writeable = False
+    im_spectra.flags.writeable = False
+    
+    return re_spectra, im_spectra
+
+# ------ GPU processing  --------------------------
+
+def run_gpu(movie, dt, Tmin, Tmax, nT, T_c = None, win_size = None):
+
+    '''
+    Same as `transform_stack`, but the wavelet transforms and
+    the ridge evaluation run on a CUDA GPU, needs CuPy to be installed.
+    The pixels get processed in chunks fitting into the free GPU memory,
+    the transforms are computed with single precision.
+
+    Parameters
+    ----------
+
+    See `transform_stack`
+
+    Returns
+    -------
+
+    results : dictionary, with keys holding the output movies,
+              see `transform_stack`
+    '''
+
+    if cp is None:
+        raise ImportError('GPU processing needs CuPy, see https://cupy.dev')
+    
+    Nt = movie.shape[0]
+    periods = get_periods(Nt, dt, Tmin, Tmax, nT)
+    Npixels = movie.shape[1] * movie.shape[2]
+    
+    logger.info(f'Computing the transforms for {Npixels} pixels on the GPU')
+
+    # pre-processing stays on the CPU, every time-series is contiguous
+    signals = np.ascontiguousarray(movie.reshape(Nt, Npixels).T)
+    signals, sigma = preprocess_signals(signals, dt, T_c, win_size)
+
+    Nfft = next_fast_len(2 * Nt - 1)
+    re_specs, im_specs = wavelet_spectra(Nt, dt, tuple(periods), Nfft)
+    re_specs = cp.asarray(re_specs)
+    im_specs = cp.asarray(im_specs)
+    periods_gpu = cp.asarray(periods, dtype=cp.float32)
+    # conversion factors for unit variance signals
+    amp_factors = cp.asarray(pbcore.power_to_amplitude(periods, 1, 1, dt),
+                             dtype=cp.float32)
+
+    # the wavelet spectra are already on the GPU
+    free_mem, _ = cp.cuda.Device().mem_info
+    chunk_size = get_block_size(Nt, int(0.8 * free_mem))
+
+    results = {key : np.empty((Npixels, Nt), dtype=np.float32)
+               for key in RESULT_KEYS}
+    
+    for start in range(0, Npixels, chunk_size):
+
+        stop = min(start + chunk_size, Npixels)
+        logger.info(f"Processed {start/Npixels * 100 :.1f}%..")
+        
+        sig_spec = cp.fft.rfft(cp.asarray(signals[start:stop]),
+                               n=Nfft, axis=-1)
+        # running maximum along the scale axis, see `transform_signals`
+        best = cp.full((stop - start, Nt), -cp.inf, dtype=cp.float32)
+        ridge_ys = cp.zeros((stop - start, Nt), dtype=cp.int32)
+        ridge_re = cp.zeros((stop - start, Nt), dtype=cp.float32)
+        ridge_im = cp.zeros((stop - start, Nt), dtype=cp.float32)
+        for i in range(nT):
+            # copies, views would keep the padded transforms alive
+            wlet_re = cp.ascontiguousarray(
+                cp.fft.irfft(sig_spec * re_specs[i], n=Nfft, axis=-1)[:, :Nt])
+            wlet_im = cp.ascontiguousarray(
+                cp.fft.irfft(sig_spec * im_specs[i], n=Nfft, axis=-1)[:, :Nt])
+
+            modulus = wlet_re**2 + wlet_im**2
+            better = ((modulus > best) |
+                      (cp.isnan(modulus) & ~cp.isnan(best)))
+            cp.copyto(best, modulus, where=better)
+            cp.copyto(ridge_ys, i, where=better)
+            cp.copyto(ridge_re, wlet_re, where=better)
+            cp.copyto(ridge_im, wlet_im, where=better)
+            del wlet_re, wlet_im, modulus, better
+        
+        sig = cp.asarray(sigma[start:stop, None])
+        # normalize with the variance of the signals
+        powers = best / sig**2
+        phases = cp.arctan2(ridge_im, ridge_re)
+        # map to [0, 2pi]
+        phases = phases % (2 * np.pi)
+        amplitudes = cp.sqrt(powers) * amp_factors[ridge_ys] * sig
+
+        # only the ridge results get copied back
+        results['phase'][start:stop] = cp.asnumpy(phases)
+        results['period'][start:stop] = cp.asnumpy(periods_gpu[ridge_ys])
+        results['power'][start:stop] = cp.asnumpy(powers)
+        results['amplitude'][start:stop] = cp.asnumpy(amplitudes)
+
+        # blocks stay in CuPy's memory pool for the next chunk
+        del sig_spec, best, ridge_ys, ridge_re, ridge_im
+
+    cp.get_default_memory_pool().free_all_blocks()
+    
+    # back to (Frames, Y, X) ordering
+    for key in results:
+        results[key] = np.ascontiguousarray(results[key].T).reshape(movie.shape)
+
+    logger.info('Done with all transformations')        
     return results
 
 # ------ Set up Multiprocessing  --------------------------
 
-def run_parallel(movie, n_cpu, **Wkwargs):
+def run_parallel(movie, n_cpu = None, **Wkwargs):
 
     '''
     Sets up parallel processing of a 3-dimensional input movie.
     See `transform_stack` above for more details. Splits the input into
-    *n_cpu* slices which get transformed individually and then get
-    stitched back together after all transforms are done. Speedup
+    *n_cpu* slices which get transformed individually. Input and
+    output movies are shared between the processes, so no
+    copies of the slices need to be sent around. Speedup
     scales practically with *n_cpu*, e.g. 4 processes are 4 times
     faster than just using `transform_stack` directly.
 
@@ -152,7 +689,9 @@ def run_parallel(movie, n_cpu, **Wkwargs):
 
     movie : ndarray with ndim = 3, transform is done along 1st axis 
     n_cpu : int, number of requested processors. A check is done if more
-                 are requested than available.
+                 are requested than available, defaults to all available.
+                 Small movies get fewer processes, see
+                 `MIN_PIXELS_PER_WORKER`.
 
     Other Parameters
     ----------------
@@ -172,20 +711,15 @@ def run_parallel(movie, n_cpu, **Wkwargs):
 
     logger.info(f"{ncpu_avail} CPU's available")
 
-    if n_cpu > ncpu_avail:
+    if n_cpu is None:
+        n_cpu = ncpu_avail
+        
+    elif n_cpu > ncpu_avail:
         logger.warning(f"Warning: requested {n_cpu} CPU's but only {ncpu_avail} available!")
         logger.info(f"Setting number of requested CPU's to {ncpu_avail}..")
 
         n_cpu = ncpu_avail
 
-    logger.info(f"Starting {n_cpu} process(es)..")
-
-
-    # initialize pool
-    pool = mp.Pool( n_cpu )
-
-    # split input movie row-wise (axis 1, axis 0 is time!)
-    movie_split = np.array_split(movie, n_cpu, axis = 1)
 
     # starmap doesn't support **kwargs passing, we need to explicitly
     # declare the parameters :/
@@ -206,24 +740,192 @@ def run_parallel(movie, n_cpu, **Wkwargs):
     except KeyError as e:
         logger.critical(f"Wavelet analysis parameter is missing: {repr(e)}, exiting..")
         sys.exit(1)
+
+    Nt = movie.shape[0]
+    Npixels = movie.shape[1] * movie.shape[2]
+
+    if n_cpu > max(1, Npixels // MIN_PIXELS_PER_WORKER):
+        n_cpu = max(1, Npixels // MIN_PIXELS_PER_WORKER)
+        logger.info(f"Only {Npixels} pixels, using {n_cpu} process(es)..")
+
+    # no need for any processes
+    if n_cpu == 1:
+        return transform_stack(movie, dt, Tmin, Tmax, nT, T_c, win_size)
+
+    logger.info(f"Starting {n_cpu} process(es)..")
     
-    # start the processes, result is list
-    # of tuples (phase, period, power, amplitude)
-    res_movies = pool.starmap( transform_stack,
-                               [(movie, dt, Tmin, Tmax, nT, T_c, win_size)
-                                for movie in movie_split] )
-
-    results = {}
-    # re-join the splitted output movies
-    results['phase'] = np.concatenate([r['phase'] for r in res_movies],
-                                       axis=1)
-    results['period'] = np.concatenate([r['period'] for r in res_movies],
-                                    axis=1)
-    results['power'] = np.concatenate( [r['power'] for r in res_movies],
-                                       axis=1)
-    results['amplitude'] = np.concatenate([r['amplitude'] for r in res_movies],
-                                          axis=1)
+    periods = get_periods(Nt, dt, Tmin, Tmax, nT)
+
+    logger.info(f'Computing the transforms for {Npixels} pixels')
+
+    # split the flattened pixels into equally sized stripes
+    bounds = np.linspace(0, Npixels, STRIPES_PER_WORKER * n_cpu + 1,
+                         dtype=int)
+    
+    # the input and the four output movies live in shared memory,
+    # the workers only get the names of the memory blocks
+    shm_in = SharedMemory(create=True, size=movie.nbytes)
+    shm_out = SharedMemory(create=True,
+                           size=len(RESULT_KEYS) * movie.size * 4)
+    try:
+        # transpose once, so that every time-series is contiguous
+        shared_signals = np.ndarray((Npixels, Nt), movie.dtype,
+                                    buffer=shm_in.buf)
+        shared_signals[:] = movie.reshape(Nt, Npixels).T
+        del shared_signals
+
+        tasks = [(shm_in.name, shm_out.name, (Npixels, Nt), movie.dtype,
+                  start, stop, dt, periods, T_c, win_size)
+                 for start, stop in zip(bounds[:-1], bounds[1:])
+                 if stop > start]
+
+        output = np.ndarray((len(RESULT_KEYS), Npixels, Nt), np.float32,
+                            buffer=shm_out.buf)
+        # the final movies in (Frames, Pixels) ordering
+        results = {key : np.empty((Nt, Npixels), dtype=np.float32)
+                   for key in RESULT_KEYS}
+
+        # the processes write their results directly into the shared
+        # output arrays, finished stripes get copied out of shared
+        # memory while the others are still being computed
+        done = 0
+        for start, stop in get_pool(n_cpu).imap_unordered(transform_task, tasks):
+            for i, key in enumerate(RESULT_KEYS):
+                results[key][:, start:stop] = output[i, start:stop].T
+
+            # show progress, roughly every 10%
+            finished = done + stop - start
+            if int(10 * finished / Npixels) > int(10 * done / Npixels):
+                logger.info(f"Processed {finished/Npixels * 100 :.1f}%..")
+            done = finished
+        del output
+
+        # back to (Frames, Y, X) ordering, no copy needed
+        for key in results:
+            results[key] = results[key].reshape(movie.shape)
+
+    finally:
+        for shm in (shm_in, shm_out):
+            shm.close()
+            shm.unlink()
 
     logger.info('Done with all transformations')        
     return results
 
+def get_pool(n_cpu):
+
+    '''
+    Returns the process pool with *n_cpu* processes, which
+    is kept alive between calls of `run_parallel` so repeated calls
+    don't pay the start up costs again. 
+
+    The processes switch off the same `OPTIONAL_BACKENDS` as this
+    process, a pool of a different size or created with
+    other backends gets replaced. Any other module state is
+    frozen at the creation of the pool, use `close_pool`
+    to have it picked up by the next call.
+    '''
+
+    global _pool, _pool_key
+
+    disabled = tuple(name for name in OPTIONAL_BACKENDS
+                     if globals()[name] is None)
+    
+    if _pool is None or _pool_key != (n_cpu, disabled):
+        close_pool()
+        _pool = mp.Pool(n_cpu, initializer=init_worker, initargs=(disabled,))
+        _pool_key = (n_cpu, disabled)
+
+    return _pool
+
+def init_worker(disabled = ()):
+
+    '''
+    Initializer of the `run_parallel` processes, switches off
+    the *disabled* optional backends like in the parent process.
+    One FFT and numexpr thread per process as the CPUs are already
+    busy with the processes.
+    '''
+
+    global FFT_WORKERS
+    FFT_WORKERS = 1
+
+    for name in disabled:
+        globals()[name] = None
+
+    if ne is not None:
+        ne.set_num_threads(1)
+
+@atexit.register
+def close_pool():
+
+    '''
+    Shuts down the process pool of `run_parallel`, if any.
+    '''
+
+    global _pool, _pool_key
+
+    if _pool is not None:
+        _pool.close()
+        _pool.join()
+        _pool = None
+        _pool_key = None
+
+def transform_range(in_name, out_name, shape, dtype, start, stop, *Wargs):
+
+    '''
+    Worker function for `run_parallel`, transforms the time-series
+    *start* to *stop* stored in the rows of the shared memory
+    block *in_name* and writes the results into the block *out_name*.
+
+    Parameters
+    ----------
+
+    in_name : str, name of the shared memory block holding the
+                   input signals, time is the last axis
+    out_name : str, name of the shared memory block holding the
+                    four 32bit outputs, ordered like `RESULT_KEYS`
+    shape : tuple, shape (Npixels, Nt) of the input signals
+    dtype : dtype of the input signals
+    start : int, first signal (pixel) to transform
+    stop  : int, the signal (pixel) after the last one to transform
+    *Wargs : the positional parameters of `transform_signals`
+
+    Returns
+    -------
+
+    start, stop : the range of signals transformed
+    '''
+
+    shm_in = SharedMemory(name=in_name)
+    shm_out = SharedMemory(name=out_name)
+    
+    signals = np.ndarray(shape, dtype, buffer=shm_in.buf)
+    output = np.ndarray((len(RESULT_KEYS), *shape), np.float32,
+                        buffer=shm_out.buf)
+
+    # progress gets shown by `run_parallel` as the stripes finish
+    block_size = get_block_size(shape[1], TRANSFORM_MEMORY)
+    for block_start in range(start, stop, block_size):
+        block_stop = min(block_start + block_size, stop)
+        results = transform_signals(signals[block_start:block_stop], *Wargs,
+                                    show_progress = False)
+        for i, key in enumerate(RESULT_KEYS):
+            output[i, block_start:block_stop] = results[key]
+        del results
+
+    # views into the shared buffers must be gone before closing
+    del signals, output
+    shm_in.close()
+    shm_out.close()
+
+    return start, stop
+
+def transform_task(args):
+
+    '''
+    Unpacks the arguments of `transform_range` for `Pool.imap_unordered`,
+    needs to be defined at module level to be picklable.
+    '''
+
+    return transform_range(*args)
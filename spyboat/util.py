@@ -2,11 +2,14 @@
 
 import sys
 from os import path
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import numpy as np
+from scipy.ndimage import gaussian_filter1d
 from skimage import io
-from skimage.transform import rescale
-from skimage.filters import gaussian, threshold_otsu
+from skimage.transform import resize
+from skimage.util import img_as_float32
+from skimage.filters import threshold_otsu
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -134,12 +137,13 @@ def save_to_tifs(results, input_name, directory):
 
 # --- pre-processing ---
 
-def down_sample(movie, scale_factor):
+def down_sample(movie, scale_factor, anti_aliasing = False):
 
     '''
     Spatially downsamples a 3-dimensional input movie (NFrames, y, x). 
-    It basically wraps around skimage.transform.rescale 
-    to properly work on image stacks (movies). 
+    It basically wraps around skimage.transform.resize
+    to properly work on image stacks (movies), frames
+    get processed concurrently.
 
     Parameters
     ----------
@@ -148,36 +152,50 @@ def down_sample(movie, scale_factor):
                                    the last two axis
     scale_factor : float, must be 0 < scale_factor <= 1 as 
                           only downsampling is supported/meaningful 
-                          here. Goes into `skimage.transform.rescale`
+                          here. Output shape is the same as for
+                          `skimage.transform.rescale`
+    anti_aliasing : bool, Gaussian smoothing of each frame before
+                          the downsampling. Not needed if the movie 
+                          gets smoothed with `gaussian_blur` afterwards
+                          anyway, so it is off by default
 
     Returns
     -------
 
-    movie_ds : ndarray with ndim = 3, the downsampled movie,
+    movie_ds : 32bit ndarray with ndim = 3, the downsampled movie,
                movie_ds.shape[0] == movie.shape[0]
     
     '''
 
     if scale_factor > 1:
         raise ValueError ('Upscaling is not supported!')
-    
-    # rescale only 1st frame to inquire output shape
-    frame1 = rescale(movie[0,...], scale = scale_factor,
-                     preserve_range=True)
-    movie_ds = np.zeros( (movie.shape[0], *frame1.shape) )
-    
-    for frame in range(movie.shape[0]):
-        movie_ds[frame,...] = rescale(movie[frame,...],
-                                      scale = scale_factor,
-                                      preserve_range=True)
+
+    # same output shape as skimage.transform.rescale would give,
+    # computed once instead of per frame
+    out_shape = tuple(max(1, int(round(s * scale_factor)))
+                      for s in movie.shape[1:])
+    movie_ds = np.empty( (movie.shape[0], *out_shape), dtype=np.float32)
+
+    def rescale_frame(frame):
+        movie_ds[frame,...] = resize(movie[frame,...], out_shape,
+                                     preserve_range=True,
+                                     anti_aliasing=anti_aliasing)
+
+    # skimage/scipy release the GIL, so threads suffice
+    with ThreadPoolExecutor() as executor:
+        # list() to propagate exceptions from the workers
+        list(executor.map(rescale_frame, range(movie.shape[0])))
 
     return movie_ds
 
 def gaussian_blur(movie, sigma):
 
     '''
-    Wraps around skimage.filters.gaussian to adhere to SpyBOAT/Fiji
-    axis ordering (Frames, ydim, xdim).
+    Gaussian smoothing of every frame of a movie with
+    SpyBOAT/Fiji axis ordering (Frames, ydim, xdim). Gives
+    the same results as skimage.filters.gaussian applied frame
+    by frame, but filters the whole stack at once with
+    two separable 1d-passes along the spatial axes.
 
     Parameters
     ----------
@@ -189,13 +207,16 @@ def gaussian_blur(movie, sigma):
     Returns
     -------
 
-    movie_gb : ndarray with ndim = 3, the blurred movie
+    movie_gb : 32bit ndarray with ndim = 3, the blurred movie
     
     '''
 
-    movie_gb = np.zeros( movie.shape )
-    for frame in range(movie.shape[0]):
-        movie_gb[frame,...] = gaussian(movie[frame,...], sigma = sigma)
+    # same intensity conversion as skimage.filters.gaussian
+    movie = img_as_float32(movie)
+    
+    movie_gb = np.empty(movie.shape, dtype=np.float32)
+    gaussian_filter1d(movie, sigma, axis=1, output=movie_gb, mode='nearest')
+    gaussian_filter1d(movie_gb, sigma, axis=2, output=movie_gb, mode='nearest')
 
     return movie_gb    
 